@@ -6,8 +6,18 @@ import os
 import subprocess
 import sys
 import signal
+import tempfile
 import platform
-from typing import Dict, List, Optional, Union
+import queue
+import re
+import shutil
+import threading
+import time
+from collections import Counter
+from contextlib import closing, contextmanager
+from types import MappingProxyType
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Tuple, Union
+import orjson
 import uvicorn
 from starlette.applications import Starlette
 from starlette.routing import Mount, Route
@@ -43,11 +53,20 @@ class CustomFormatter(logging.Formatter):
             logging.ERROR: self.red + self.fmt + self.reset,
             logging.CRITICAL: self.bold_red + self.fmt + self.reset
         }
+        
+        # 日志输出到 stderr；非终端 (重定向到文件或管道) 时不添加颜色控制符
+        self._use_color = sys.stderr.isatty()
+        self._plain_formatter = logging.Formatter(self.fmt, datefmt="%H:%M:%S")
+        # 每个级别的彩色格式器只创建一次
+        self._formatters = {
+            level: logging.Formatter(fmt, datefmt="%H:%M:%S")
+            for level, fmt in self.FORMATS.items()
+        }
 
     def format(self, record):
-        log_fmt = self.FORMATS.get(record.levelno)
-        formatter = logging.Formatter(log_fmt, datefmt="%H:%M:%S")
-        return formatter.format(record)
+        if not self._use_color:
+            return self._plain_formatter.format(record)
+        return self._formatters.get(record.levelno, self._plain_formatter).format(record)
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -57,6 +76,75 @@ ch.setLevel(logging.INFO)
 ch.setFormatter(CustomFormatter())
 logger.addHandler(ch)
 
+# 可直接用作 tshark -J 协议匹配过滤器的协议名
+_PROTOCOL_NAME_RE = re.compile(r"^[a-z0-9_-]+$")
+
+# analyze_protocols 始终保留的上下文协议层 (时间戳、MAC/IP 地址、端口等)
+_PROTOCOL_CONTEXT_LAYERS = "frame eth ip ipv6 tcp udp"
+
+# tshark -D 输出行，例如 "1. eth0"、"2. lo (Loopback)"、"3. en0 [Wi-Fi]"
+_IFACE_RE = re.compile(r"^\s*\d+\.\s+(\S+)(?:\s+\((.*?)\))?(?:\s+\[(.*?)\])?\s*$")
+
+# analyze_errors 各错误类型对应的显示过滤器
+_ERROR_FILTERS: Mapping[str, str] = MappingProxyType({
+    "all": "(_ws.malformed) or (tcp.analysis.flags) or (tcp.analysis.retransmission) or (tcp.analysis.duplicate_ack) or (tcp.analysis.lost_segment)",
+    "malformed": "_ws.malformed",
+    "tcp": "tcp.analysis.flags",
+    "retransmission": "tcp.analysis.retransmission",
+    "duplicate_ack": "tcp.analysis.duplicate_ack",
+    "lost_segment": "tcp.analysis.lost_segment"
+})
+
+# list_interfaces 结果的缓存时间 (秒)
+_INTERFACES_CACHE_TTL = 30
+
+# 超过该大小的文件在按过滤器分析前，先用 editcap 截取开头部分数据包
+_PREFILTER_MIN_SIZE = 100 * 1024 * 1024
+# editcap 截取的数据包数量为 max_packets 的倍数
+_PREFILTER_PACKET_FACTOR = 10
+# 按文件大小估算总包数时假定的单个数据包平均占用字节数 (偏大估计，宁可少截取)
+_PREFILTER_AVG_PACKET_SIZE = 1500
+# 截取数量至少要比估算总包数小这个倍数才值得预截取，否则 editcap 几乎会复制整个文件
+_PREFILTER_MIN_RATIO = 4
+
+# 流式读取 tshark 输出时单次读取的最大字节数
+_READ_CHUNK_SIZE = 1 << 20
+# 读取线程与解析端之间最多缓存的数据块数量
+_READ_QUEUE_SIZE = 16
+
+def _count_lines(chunks: Iterable[bytes]) -> Counter:
+    """统计字节块流中每一行 (去除首尾空白，忽略空行) 出现的次数
+    
+    换行扫描由 bytes.split 在整块缓冲区上完成，计数由 Counter 在 C 层完成，
+    只有跨块的不完整行需要在 Python 层拼接。
+    """
+    counter = Counter()
+    tail = b""
+    for chunk in chunks:
+        lines = (tail + chunk).split(b"\n")
+        tail = lines.pop()
+        counter.update(map(bytes.strip, lines))
+    counter[tail.strip()] += 1
+    counter.pop(b"", None)
+    return counter
+
+def _json_dumps(obj) -> str:
+    """将对象序列化为紧凑的 JSON 字符串 (orjson 原生输出 UTF-8，无需 ensure_ascii)
+    
+    结果由客户端程序解析，不做缩进以减小响应体积。
+    """
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+# 文件不存在时的响应模板，%s 处填入经过 JSON 转义的文件路径
+_FILE_NOT_FOUND_TEMPLATE = (
+    '{"status":"error","error":{"type":"file_not_found","message":"找不到文件: %s",'
+    '"details":{"suggestions":["检查文件路径是否正确","确认文件是否存在","验证文件访问权限"]}}}'
+)
+
+def _file_not_found(file_path: str) -> str:
+    """生成文件不存在的错误响应，只对文件路径做 JSON 转义"""
+    return _FILE_NOT_FOUND_TEMPLATE % orjson.dumps(file_path).decode()[1:-1]
+
 class WiresharkMCP:
     def __init__(self, tshark_path: str = "tshark"):
         """初始化 Wireshark MCP 服务器
@@ -64,16 +152,34 @@ class WiresharkMCP:
         Args:
             tshark_path: tshark 可执行文件的路径
         """
-        self.tshark_path = tshark_path
+        # 解析为绝对路径：配合 close_fds=False，CPython 会使用 posix_spawn
+        # 而不是 fork + exec 启动 tshark，降低每次工具调用的进程创建开销
+        self.tshark_path = shutil.which(tshark_path) or tshark_path
         self._verify_tshark()
+        # 元数据中不随调用变化的部分，只构建一次
+        self._metadata_base = {"tshark_version": self._get_tshark_version()}
+        
+        # editcap 随 tshark 一同安装，优先使用同目录下的版本
+        tshark_dir = os.path.dirname(self.tshark_path)
+        self.editcap_path = ((tshark_dir and shutil.which("editcap", path=tshark_dir))
+                             or shutil.which("editcap"))
         self.running = True
         
+        # 协议列表在 tshark 生命周期内不变；接口列表短时间缓存
+        self._protocols_cache: Optional[List[str]] = None
+        self._interfaces_cache: Optional[List[Dict[str, str]]] = None
+        self._interfaces_cached_at = 0.0
+        
     def _verify_tshark(self):
         """验证 tshark 是否可用"""
         try:
-            subprocess.run([self.tshark_path, "-v"], 
-                         capture_output=True, 
-                         check=True)
+            proc = subprocess.run([self.tshark_path, "-v"], 
+                                capture_output=True, 
+                                text=True,
+                                close_fds=False,
+                                check=True)
+            # 缓存版本信息，避免每次调用都重新运行 tshark -v
+            self._tshark_version = proc.stdout.split("\n", 1)[0].strip()
         except subprocess.CalledProcessError as e:
             logger.error(f"tshark 验证失败: {e}")
             raise
@@ -81,24 +187,40 @@ class WiresharkMCP:
             logger.error(f"找不到 tshark: {self.tshark_path}")
             raise
 
-    def _format_json_output(self, json_str: str, max_packets: int = 5000) -> str:
-        """格式化 JSON 输出为易读形式，并限制数据包数量
+    def _format_json_output_obj(self,
+                                json_str: Union[str, List[Dict]],
+                                max_packets: int = 5000,
+                                truncated: bool = False) -> Dict:
+        """将 tshark 输出包装为结果字典，并限制数据包数量
         
         Args:
-            json_str: JSON 字符串
+            json_str: JSON 字符串，或已流式解析好的数据包列表
             max_packets: 最大数据包数量
+            truncated: 是否因达到 max_packets 而提前停止读取
         """
         try:
             # 基础元数据
             metadata = {
                 "timestamp": datetime.now().isoformat(),
-                "tshark_version": self._get_tshark_version(),
+                **self._metadata_base,
                 "max_packets": max_packets
             }
             
+            # 已流式解析的数据包列表
+            if isinstance(json_str, list):
+                packet_stats = self._packet_stats(len(json_str), max_packets, truncated)
+                if json_str:
+                    return {
+                        "status": "success",
+                        "metadata": metadata,
+                        "statistics": packet_stats,
+                        "data": json_str
+                    }
+                json_str = ""
+                
             # 如果输入为空
             if not json_str.strip():
-                return json.dumps({
+                return {
                     "status": "no_data",
                     "metadata": metadata,
                     "message": "没有找到匹配的数据包",
@@ -109,47 +231,39 @@ class WiresharkMCP:
                             "文件可能为空"
                         ]
                     }
-                }, ensure_ascii=False, indent=2)
+                }
                 
             # 尝试解析 JSON
             if json_str.startswith("[") or json_str.startswith("{"):
-                data = json.loads(json_str)
+                data = orjson.loads(json_str)
                 
                 if isinstance(data, list):
-                    # 添加数据包统计信息
-                    packet_stats = {
-                        "total_packets": len(data),
-                        "returned_packets": min(len(data), max_packets),
-                        "truncated": len(data) > max_packets
-                    }
-                    
-                    # 如果需要截断
-                    if packet_stats["truncated"]:
-                        data = data[:max_packets]
-                        
-                    return json.dumps({
+                    # 数据包数量已由 tshark -c 限制，这里不再截断
+                    packet_stats = self._packet_stats(len(data), max_packets,
+                                                      len(data) >= max_packets)
+                    return {
                         "status": "success",
                         "metadata": metadata,
                         "statistics": packet_stats,
                         "data": data
-                    }, ensure_ascii=False, indent=2)
+                    }
                     
                 # 如果是对象，直接包装
-                return json.dumps({
+                return {
                     "status": "success",
                     "metadata": metadata,
                     "data": data
-                }, ensure_ascii=False, indent=2)
+                }
             
             # 处理非 JSON 格式的输出
-            return json.dumps({
+            return {
                 "status": "success",
                 "metadata": metadata,
                 "data": json_str.strip().split("\n")
-            }, ensure_ascii=False, indent=2)
+            }
             
         except json.JSONDecodeError as e:
-            return json.dumps({
+            return {
                 "status": "error",
                 "metadata": metadata,
                 "error": {
@@ -157,22 +271,116 @@ class WiresharkMCP:
                     "message": str(e),
                     "raw_data": json_str[:200] + "..." if len(json_str) > 200 else json_str
                 }
-            }, ensure_ascii=False, indent=2)
+            }
             
+    def _packet_stats(self, count: int, max_packets: int, truncated: bool) -> Dict:
+        """构建数据包统计信息
+        
+        tshark 通过 -c 在读取端限制数据包数量，无法得知文件中的总包数；
+        返回数量达到 max_packets 时视为可能被截断。
+        """
+        packet_stats = {
+            "total_packets": count,
+            "returned_packets": count,
+            "truncated": truncated
+        }
+        if truncated:
+            packet_stats["note"] = f"已达到 max_packets ({max_packets}) 上限，可能还有更多数据包未返回"
+        return packet_stats
+
     def _get_tshark_version(self) -> str:
-        """获取 tshark 版本信息"""
+        """获取 tshark 版本信息 (在初始化时已缓存)"""
+        return self._tshark_version or "unknown"
+
+    def _format_command_error(self, cmd: List[str], e: subprocess.CalledProcessError) -> Dict:
+        """格式化 tshark 命令执行失败的错误信息"""
+        error_msg = f"tshark 命令执行失败: {e.stderr if e.stderr else str(e)}"
+        logger.error(error_msg)
+        return {
+            "error": error_msg,
+            "command": " ".join(cmd),
+            "建议": "请检查文件路径是否正确，以及是否有读取权限"
+        }
+
+    def _iter_tshark_output(self, cmd: List[str], chunked: bool = False) -> Iterator[bytes]:
+        """以流式方式运行 tshark 命令，逐行 (或按块) 产出标准输出
+        
+        后台线程持续读取 stdout 并放入有界队列，使 tshark 的解析与 Python 端的
+        处理并行进行，Python 处理较慢时 tshark 也不会因管道写满而停顿。
+        
+        调用方提前停止迭代（并关闭生成器）时会终止 tshark 进程；
+        tshark 异常退出时抛出 subprocess.CalledProcessError。
+        
+        Args:
+            cmd: tshark 命令参数列表
+            chunked: 为 True 时产出最多 _READ_CHUNK_SIZE 字节的原始数据块，
+                否则产出去掉换行符的单行数据
+        """
+        proc = subprocess.Popen(cmd,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE,
+                                bufsize=_READ_CHUNK_SIZE,
+                                close_fds=False)
+        # 后台线程持续读取 stderr，避免管道写满导致 tshark 阻塞
+        stderr_chunks: List[bytes] = []
+        drainer = threading.Thread(target=lambda: stderr_chunks.append(proc.stderr.read()),
+                                   daemon=True)
+        drainer.start()
+        
+        # 读取线程将 stdout 数据块放入队列，读到 EOF 后放入 None
+        chunks: "queue.Queue[Optional[bytes]]" = queue.Queue(maxsize=_READ_QUEUE_SIZE)
+        
+        def read_stdout():
+            try:
+                for chunk in iter(lambda: proc.stdout.read1(_READ_CHUNK_SIZE), b""):
+                    chunks.put(chunk)
+            finally:
+                chunks.put(None)
+                
+        reader = threading.Thread(target=read_stdout, daemon=True)
+        reader.start()
+        
+        reader_done = False
+        completed = False
         try:
-            proc = subprocess.run([self.tshark_path, "-v"],
-                                capture_output=True,
-                                text=True,
-                                check=True)
-            version_line = proc.stdout.split("\n")[0]
-            return version_line.strip()
-        except Exception:
-            return "unknown"
+            tail = b""
+            for chunk in iter(chunks.get, None):
+                if chunked:
+                    yield chunk
+                    continue
+                lines = (tail + chunk).split(b"\n")
+                tail = lines.pop()
+                yield from lines
+            reader_done = True
+            if tail:
+                yield tail
+            completed = True
+        finally:
+            if not completed:
+                proc.terminate()
+                # 清空队列，让读取线程读到 EOF 后退出
+                while not reader_done:
+                    reader_done = chunks.get() is None
+            reader.join()
+            proc.stdout.close()
+            returncode = proc.wait()
+            drainer.join()
+            proc.stderr.close()
+            
+        if returncode != 0:
+            raise subprocess.CalledProcessError(
+                returncode, cmd,
+                stderr=b"".join(stderr_chunks).decode("utf-8", errors="replace"))
 
     def _run_tshark_command(self, cmd: List[str], max_packets: int = 5000) -> str:
-        """运行 tshark 命令并处理输出
+        """运行 tshark 命令并返回 JSON 字符串结果"""
+        return _json_dumps(self._run_tshark_command_obj(cmd, max_packets))
+
+    def _run_tshark_command_obj(self, cmd: List[str], max_packets: int = 5000) -> Dict:
+        """运行 tshark 命令并处理输出，返回尚未序列化的结果字典
+        
+        对于 -T ek 输出，数据包在 tshark 写出时即被逐行解析，
+        达到 max_packets 后立即终止 tshark，不再读取剩余输出。
         
         Args:
             cmd: tshark 命令参数列表
@@ -185,20 +393,88 @@ class WiresharkMCP:
                 if c_index + 1 < len(cmd):
                     packet_count = max(1, int(cmd[c_index + 1]))
                     cmd[c_index + 1] = str(packet_count)
+            max_packets = max(1, max_packets)
             
-            proc = subprocess.run(cmd,
-                                capture_output=True,
-                                text=True,
-                                check=True)
-            return self._format_json_output(proc.stdout, max_packets)
+            output_format = cmd[cmd.index("-T") + 1] if "-T" in cmd else ""
+            if output_format == "ek":
+                # -T ek 每行一个 JSON 对象，每个数据包前有一行 {"index": ...} 头记录
+                packets: List[Dict] = []
+                truncated = False
+                with closing(self._iter_tshark_output(cmd)) as lines:
+                    for line in lines:
+                        if not line.strip() or line.startswith(b'{"index"'):
+                            continue
+                        packets.append(orjson.loads(line))
+                        if len(packets) >= max_packets:
+                            truncated = True
+                            break
+                return self._format_json_output_obj(packets, max_packets, truncated)
+                
+            with closing(self._iter_tshark_output(cmd, chunked=True)) as chunks:
+                output = b"".join(chunks).decode("utf-8", errors="replace")
+            return self._format_json_output_obj(output, max_packets)
         except subprocess.CalledProcessError as e:
-            error_msg = f"tshark 命令执行失败: {e.stderr if e.stderr else str(e)}"
+            return self._format_command_error(cmd, e)
+        except json.JSONDecodeError as e:
+            error_msg = f"tshark 输出解析失败: {e}"
             logger.error(error_msg)
-            return json.dumps({
+            return {
                 "error": error_msg,
-                "command": " ".join(cmd),
-                "建议": "请检查文件路径是否正确，以及是否有读取权限"
-            }, ensure_ascii=False, indent=2)
+                "command": " ".join(cmd)
+            }
+
+    @contextmanager
+    def _prefilter_capture(self,
+                           file_path: str,
+                           max_packets: int,
+                           enabled: bool = True) -> Iterator[Tuple[str, Optional[int]]]:
+        """对大文件先用 editcap 截取前 max_packets * _PREFILTER_PACKET_FACTOR 个数据包
+        
+        tshark 的显示过滤器需要先解析每个数据包，对大文件代价很高；
+        截取后 tshark 只需解析临时文件中的数据包。
+        
+        产出 (实际读取的文件路径, 截取的数据包数量)；未启用、文件较小、
+        截取数量相对估算总包数不够小、找不到 editcap 或截取失败时产出 (file_path, None)。
+        
+        Args:
+            file_path: pcap 文件路径
+            max_packets: 最大数据包数量
+            enabled: 是否启用预截取
+        """
+        file_size = os.path.getsize(file_path)
+        packet_limit = max(1, max_packets) * _PREFILTER_PACKET_FACTOR
+        estimated_packets = file_size // _PREFILTER_AVG_PACKET_SIZE
+        if (not enabled or not self.editcap_path
+                or file_size <= _PREFILTER_MIN_SIZE
+                or packet_limit * _PREFILTER_MIN_RATIO > estimated_packets):
+            yield file_path, None
+            return
+            
+        fd, tmp_path = tempfile.mkstemp(suffix=".pcapng")
+        os.close(fd)
+        try:
+            try:
+                subprocess.run([self.editcap_path, "-r", file_path, tmp_path, f"1-{packet_limit}"],
+                               capture_output=True,
+                               close_fds=False,
+                               check=True)
+            except (subprocess.CalledProcessError, OSError) as e:
+                logger.warning(f"editcap 截取失败，改为读取完整文件: {e}")
+                yield file_path, None
+            else:
+                yield tmp_path, packet_limit
+        finally:
+            os.remove(tmp_path)
+
+    def _annotate_prefilter(self, result: Dict, file_path: str, packet_limit: Optional[int]):
+        """在结果元数据中记录 editcap 预截取信息"""
+        if packet_limit and isinstance(result.get("metadata"), dict):
+            # editcap 截取的是上限，文件包数少于该值时实际已包含全部数据包
+            result["metadata"]["prefilter"] = {
+                "source_file": file_path,
+                "max_scanned_packets": packet_limit,
+                "note": f"文件较大，最多只分析了前 {packet_limit} 个数据包，之后的数据包可能未被检查"
+            }
 
     def capture_live(self, 
                     interface: str, 
@@ -216,8 +492,10 @@ class WiresharkMCP:
         cmd = [
             self.tshark_path,
             "-i", interface,
+            "-n",
             "-a", f"duration:{duration}",
-            "-T", "json",
+            "-T", "ek",
+            "-l",
             "-c", str(max_packets)
         ]
         if filter:
@@ -226,21 +504,28 @@ class WiresharkMCP:
         return self._run_tshark_command(cmd, max_packets)
 
     def list_interfaces(self) -> List[Dict[str, str]]:
-        """列出可用的网络接口"""
+        """列出可用的网络接口 (结果缓存 _INTERFACES_CACHE_TTL 秒)"""
+        now = time.monotonic()
+        if (self._interfaces_cache is not None
+                and now - self._interfaces_cached_at < _INTERFACES_CACHE_TTL):
+            return [dict(iface) for iface in self._interfaces_cache]
+            
         cmd = [self.tshark_path, "-D"]
         try:
             proc = subprocess.run(cmd,
                                 capture_output=True,
                                 text=True,
+                                close_fds=False,
                                 check=True)
             interfaces = []
             for line in proc.stdout.splitlines():
-                if line.strip():
-                    parts = line.split(".", 1)[1].strip().split("[", 1)
-                    iface = parts[0].strip()
-                    desc = parts[1].rstrip("]").strip() if len(parts) > 1 else ""
-                    interfaces.append({"name": iface, "description": desc})
-            return interfaces
+                m = _IFACE_RE.match(line)
+                if m:
+                    interfaces.append({"name": m.group(1),
+                                       "description": m.group(3) or m.group(2) or ""})
+            self._interfaces_cache = interfaces
+            self._interfaces_cached_at = now
+            return [dict(iface) for iface in interfaces]
         except subprocess.CalledProcessError as e:
             logger.error(f"获取接口列表失败: {e}")
             raise
@@ -259,21 +544,39 @@ class WiresharkMCP:
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"找不到文件: {file_path}")
             
-        cmd = [
-            self.tshark_path,
-            "-r", file_path,
-            "-T", "json",
-            "-c", str(max_packets)
-        ]
-        if filter:
-            cmd.extend(["-Y", filter])
+        # 无过滤器时 tshark 读到 max_packets 个数据包即停止，无需预截取
+        with self._prefilter_capture(file_path, max_packets, enabled=bool(filter)) as (read_path, packet_limit):
+            cmd = [
+                self.tshark_path,
+                "-r", read_path,
+                "-n",
+                "-T", "ek",
+                "-l",
+                "-c", str(max_packets)
+            ]
+            if filter:
+                cmd.extend(["-Y", filter])
+                
+            result = self._run_tshark_command_obj(cmd, max_packets)
             
-        return self._run_tshark_command(cmd, max_packets)
+        self._annotate_prefilter(result, file_path, packet_limit)
+        return _json_dumps(result)
 
     def get_protocols(self) -> List[str]:
-        """获取支持的协议列表"""
-        cmd = [self.tshark_path, "-G", "protocols"]
-        return self._run_tshark_command(cmd).splitlines()
+        """获取支持的协议列表 (结果在首次调用后缓存)"""
+        if self._protocols_cache is None:
+            cmd = [self.tshark_path, "-G", "protocols"]
+            try:
+                proc = subprocess.run(cmd,
+                                    capture_output=True,
+                                    text=True,
+                                    close_fds=False,
+                                    check=True)
+            except subprocess.CalledProcessError as e:
+                logger.error(f"获取协议列表失败: {e}")
+                raise
+            self._protocols_cache = [line for line in proc.stdout.splitlines() if line.strip()]
+        return list(self._protocols_cache)
 
     def get_packet_statistics(self, 
                             file_path: str,
@@ -287,6 +590,7 @@ class WiresharkMCP:
         cmd = [
             self.tshark_path,
             "-r", file_path,
+            "-n",
             "-q",
             "-z", "io,stat,1",  # 1秒间隔的 I/O 统计
             "-z", "conv,ip",    # IP 会话统计
@@ -311,28 +615,12 @@ class WiresharkMCP:
             max_packets: 最大数据包数量
         """
         if not os.path.exists(file_path):
-            return json.dumps({
-                "status": "error",
-                "metadata": {
-                    "timestamp": datetime.now().isoformat(),
-                    "file_path": file_path
-                },
-                "error": {
-                    "type": "file_not_found",
-                    "message": f"找不到文件: {file_path}",
-                    "details": {
-                        "suggestions": [
-                            "检查文件路径是否正确",
-                            "确认文件是否存在",
-                            "验证文件访问权限"
-                        ]
-                    }
-                }
-            }, ensure_ascii=False, indent=2)
+            return _file_not_found(file_path)
             
         cmd = [
             self.tshark_path,
             "-r", file_path,
+            "-n",
             "-T", "fields"
         ]
         
@@ -342,66 +630,64 @@ class WiresharkMCP:
         if filter:
             cmd.extend(["-Y", filter])
             
+        # max_packets <= 0 表示不限制数据包数量
         if max_packets > 0:
             cmd.extend(["-c", str(max_packets)])
         
-        result = self._run_tshark_command(cmd, max_packets)
-        
-        # 处理字段提取结果
-        if isinstance(result, str) and not result.startswith("{"):
-            lines = [line.strip() for line in result.splitlines() if line.strip()]
-            if not lines:
-                return json.dumps({
-                    "status": "no_data",
-                    "metadata": {
-                        "timestamp": datetime.now().isoformat(),
-                        "file_path": file_path,
-                        "fields": fields,
-                        "filter": filter
-                    },
-                    "message": "没有找到匹配的数据包",
-                    "details": {
-                        "fields_requested": fields,
-                        "filter_applied": filter or "无"
-                    }
-                }, ensure_ascii=False, indent=2)
-                
-            # 统计字段值出现次数
-            from collections import Counter
-            counter = Counter(lines)
-            total = len(lines)
-            top10 = counter.most_common(10)
-            
-            # 格式化统计结果
-            stats = {
-                "status": "success",
+        # 按大块读取字段提取结果，直接统计字段值出现次数
+        try:
+            with closing(self._iter_tshark_output(cmd, chunked=True)) as chunks:
+                counter = _count_lines(chunks)
+        except subprocess.CalledProcessError as e:
+            return _json_dumps(self._format_command_error(cmd, e))
+            
+        total = sum(counter.values())
+        if not total:
+            return _json_dumps({
+                "status": "no_data",
                 "metadata": {
                     "timestamp": datetime.now().isoformat(),
                     "file_path": file_path,
                     "fields": fields,
                     "filter": filter
                 },
-                "statistics": {
-                    "total_values": total,
-                    "unique_values": len(counter),
-                    "top_values": [
-                        {
-                            "value": k,
-                            "count": v,
-                            "percentage": round(v/total*100, 2),
-                            "frequency": f"{v}/{total}"
-                        } for k, v in top10
-                    ]
-                },
-                "summary": {
-                    "most_common": top10[0][0] if top10 else None,
-                    "most_common_count": top10[0][1] if top10 else 0
+                "message": "没有找到匹配的数据包",
+                "details": {
+                    "fields_requested": fields,
+                    "filter_applied": filter or "无"
                 }
-            }
+            })
             
-            return json.dumps(stats, ensure_ascii=False, indent=2)
-            
-        return result
+        top10 = [(k.decode("utf-8", errors="replace"), v) for k, v in counter.most_common(10)]
+        
+        # 格式化统计结果
+        stats = {
+            "status": "success",
+            "metadata": {
+                "timestamp": datetime.now().isoformat(),
+                "file_path": file_path,
+                "fields": fields,
+                "filter": filter
+            },
+            "statistics": {
+                "total_values": total,
+                "unique_values": len(counter),
+                "top_values": [
+                    {
+                        "value": k,
+                        "count": v,
+                        "percentage": round(v/total*100, 2),
+                        "frequency": f"{v}/{total}"
+                    } for k, v in top10
+                ]
+            },
+            "summary": {
+                "most_common": top10[0][0] if top10 else None,
+                "most_common_count": top10[0][1] if top10 else 0
+            }
+        }
+        
+        return _json_dumps(stats)
 
     def analyze_protocols(self,
                         file_path: str,
@@ -415,38 +701,34 @@ class WiresharkMCP:
             max_packets: 最大数据包数量
         """
         if not os.path.exists(file_path):
-            return json.dumps({
-                "error": f"找不到文件: {file_path}",
-                "建议": "请检查文件路径是否正确"
-            }, ensure_ascii=False, indent=2)
+            return _file_not_found(file_path)
             
         cmd = [
             self.tshark_path,
             "-r", file_path,
-            "-T", "json",
+            "-n",
+            "-T", "ek",
+            "-l",
             "-c", str(max_packets)
         ]
         
         if protocol:
             # 直接使用协议名称作为过滤器，不添加 $ 符号
             cmd.extend(["-Y", protocol.lower()])
+            # 纯协议名时只输出该协议及其链路/网络/传输层上下文，减少输出体积；
+            # -J 只过滤输出内容，tshark 仍会完整解析每一层协议
+            if _PROTOCOL_NAME_RE.match(protocol.lower()):
+                cmd.extend(["-J", f"{_PROTOCOL_CONTEXT_LAYERS} {protocol.lower()}"])
             
-        result = self._run_tshark_command(cmd, max_packets)
+        result = self._run_tshark_command_obj(cmd, max_packets)
         
-        # 解析结果并添加统计信息
-        try:
-            data = json.loads(result)
-            if isinstance(data, list):
-                stats = {
-                    "协议": protocol if protocol else "all",
-                    "总数据包数": len(data),
-                    "数据包详情": data
-                }
-                return json.dumps(stats, ensure_ascii=False, indent=2)
-        except json.JSONDecodeError:
-            pass
+        # 添加统计信息
+        if isinstance(result.get("data"), list):
+            result["协议"] = protocol if protocol else "all"
+            result["总数据包数"] = len(result["data"])
+            result["数据包详情"] = result.pop("data")
             
-        return result
+        return _json_dumps(result)
 
     def analyze_errors(self,
                       file_path: str,
@@ -460,48 +742,34 @@ class WiresharkMCP:
             max_packets: 最大数据包数量
         """
         if not os.path.exists(file_path):
-            return json.dumps({
-                "error": f"找不到文件: {file_path}",
-                "建议": "请检查文件路径是否正确"
-            }, ensure_ascii=False, indent=2)
+            return _file_not_found(file_path)
         
         # 根据错误类型设置过滤器
-        filters = {
-            "all": "(_ws.malformed) or (tcp.analysis.flags) or (tcp.analysis.retransmission) or (tcp.analysis.duplicate_ack) or (tcp.analysis.lost_segment)",
-            "malformed": "_ws.malformed",
-            "tcp": "tcp.analysis.flags",
-            "retransmission": "tcp.analysis.retransmission",
-            "duplicate_ack": "tcp.analysis.duplicate_ack",
-            "lost_segment": "tcp.analysis.lost_segment"
-        }
-        
-        filter_expr = filters.get(error_type, filters["all"])
+        filter_expr = _ERROR_FILTERS.get(error_type, _ERROR_FILTERS["all"])
         
-        cmd = [
-            self.tshark_path,
-            "-r", file_path,
-            "-Y", filter_expr,
-            "-T", "json",
-            "-c", str(max_packets)
-        ]
-        
-        result = self._run_tshark_command(cmd, max_packets)
+        with self._prefilter_capture(file_path, max_packets) as (read_path, packet_limit):
+            cmd = [
+                self.tshark_path,
+                "-r", read_path,
+                "-n",
+                "-Y", filter_expr,
+                "-T", "ek",
+                "-l",
+                "-c", str(max_packets)
+            ]
+            
+            result = self._run_tshark_command_obj(cmd, max_packets)
+            
+        self._annotate_prefilter(result, file_path, packet_limit)
         
-        # 如果是 JSON 字符串，解析并添加统计信息
-        try:
-            data = json.loads(result)
-            if isinstance(data, list):
-                stats = {
-                    "总错误包数": len(data),
-                    "错误类型": error_type,
-                    "过滤器表达式": filter_expr,
-                    "数据包详情": data
-                }
-                return json.dumps(stats, ensure_ascii=False, indent=2)
-        except json.JSONDecodeError:
-            pass
+        # 添加统计信息
+        if isinstance(result.get("data"), list):
+            result["总错误包数"] = len(result["data"])
+            result["错误类型"] = error_type
+            result["过滤器表达式"] = filter_expr
+            result["数据包详情"] = result.pop("data")
         
-        return result
+        return _json_dumps(result)
 
     def stop(self):
         """停止服务器"""
@@ -610,9 +878,8 @@ def handle_exit(signum, frame):
         # 使用 os._exit 确保程序立即退出
         os._exit(0)
 
-def homepage(request: Request) -> HTMLResponse:
-    """根路由处理器"""
-    html_content = """
+# 状态页面内容在导入时编码一次，每次请求直接复用
+_HOMEPAGE_BYTES = """
     <!DOCTYPE html>
     <html>
     <head>
@@ -847,8 +1114,12 @@ def homepage(request: Request) -> HTMLResponse:
         </div>
     </body>
     </html>
-    """
-    return HTMLResponse(html_content)
+    """.encode("utf-8")
+
+def homepage(request: Request) -> HTMLResponse:
+    """根路由处理器"""
+    return HTMLResponse(content=_HOMEPAGE_BYTES,
+                        headers={"cache-control": "public, max-age=60"})
 
 async def root_redirect(request: Request):
     """将根路径重定向到状态页面"""
@@ -940,11 +1211,16 @@ def main():
         logger.info(f"SSE 端点: http://{args.host}:{args.port}/")
         
         # 配置 uvicorn 服务器
+        # loop/http 为 "auto" 时，安装了 uvloop 与 httptools (uvicorn[standard]) 即自动启用；
+        # SSE 会话保存在进程内存中，因此保持单 worker
         config = uvicorn.Config(
             app,
             host=args.host,
             port=args.port,
-            log_level="info"
+            loop="auto",
+            http="auto",
+            log_level="warning",
+            access_log=False
         )
         server_instance = uvicorn.Server(config)
         server_instance.run()